@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Compares the client CPU time per push of RequestsTransport and Urllib3Transport against a local stub of the API,
+after checking that both transports behave the same way through SpontitResource.
+
+Usage: python3 helpers/bench_transport.py [--requests 2000]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spontit import SpontitResource, RequestsTransport, Urllib3Transport  # noqa: E402
+
+
+class _StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def __respond(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "/redirect_" in self.path:
+            # e.g. /v3/redirect_307 redirects to /v3/redirected with status 307.
+            self.send_response(int(self.path.rsplit("_", 1)[1]))
+            self.send_header("Location", "redirected")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.endswith("/not_json"):
+            content, content_type = b"not json", "text/plain"
+        else:
+            content = json.dumps({
+                "data": {
+                    "method": self.command,
+                    "path": self.path,
+                    "userId": self.headers.get("X-UserId"),
+                    "contentType": self.headers.get("Content-Type"),
+                    "bodyBytes": len(body),
+                    "body": body.decode("utf-8", "replace") if self.headers.get("Content-Type") is None else None
+                }
+            }).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = __respond
+
+
+def _serve(port_queue):
+    server = _StubServer(("127.0.0.1", 0), _StubHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def _resource(transport, port):
+    resource = SpontitResource("bench_user", "bench_key", transport=transport)
+    # Point the resource at the stub instead of api.spontit.com.
+    resource._SpontitResource__url = f"http://127.0.0.1:{port}/v3/"
+    return resource
+
+
+def check_behavior(transport, port):
+    """
+    Runs the same calls through a transport and returns what the stub saw, so that transports can be compared.
+    """
+    resource = _resource(transport, port)
+    push = resource.push("Hello!", push_title="Title", push_to_followers=["a", "b"])["data"]
+    channels = resource.get_channels()["data"]
+    not_json = resource._request({}, "not_json", SpontitResource.RequestMethod.GET)
+    redirects = {status: resource._request({"redirect": status}, f"redirect_{status}",
+                                           SpontitResource.RequestMethod.POST)
+                 for status in (301, 302, 303, 307, 308)}
+
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+        f.write(b"\x89PNG not really an image")
+    try:
+        upload = resource.channel_profile_image_upload(f.name, is_png=True, channel_name="bench")["data"]
+    finally:
+        os.remove(f.name)
+
+    return {
+        "push": (push["method"], push["path"], push["userId"], json.loads(push["body"])),
+        "channels": (channels["method"], channels["path"]),
+        "not_json": (not_json.status_code, not_json.content),
+        # A redirect that is not followed comes back as the raw response, which is compared by its status.
+        "redirects": {status: (redirect["data"]["method"], redirect["data"]["path"], redirect["data"]["body"])
+                      if type(redirect) is dict else redirect.status_code for status, redirect in redirects.items()},
+        "upload": (upload["method"], upload["path"], upload["contentType"].split(";")[0], upload["bodyBytes"] > 0)
+    }
+
+
+def measure(transport, port, count):
+    """
+    :return: the client CPU seconds and wall seconds per push
+    """
+    resource = _resource(transport, port)
+    for _ in range(min(100, count)):
+        resource.push("warm up")
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    for index in range(count):
+        resource.push(f"Push {index}", push_to_followers=["a", "b"])
+    return (time.process_time() - cpu_started) / count, (time.perf_counter() - wall_started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="number of pushes to time per transport")
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    port = port_queue.get(timeout=10)
+
+    try:
+        expected = check_behavior(RequestsTransport(), port)
+        actual = check_behavior(Urllib3Transport(), port)
+        if actual != expected:
+            print(f"FAIL: transports behave differently\nrequests: {expected}\nurllib3:  {actual}")
+            return 1
+        print("Both transports behave the same way.")
+
+        results = dict()
+        for name, transport in (("requests", RequestsTransport()), ("urllib3", Urllib3Transport())):
+            cpu, wall = measure(transport, port, args.requests)
+            results[name] = cpu
+            print(f"{name:<10}{cpu * 1e6:>10.1f} us CPU/push{wall * 1e6:>10.1f} us wall/push")
+        saved = results["requests"] - results["urllib3"]
+        print(f"urllib3 saves {saved * 1e6:.1f} us of CPU per push ({saved / results['requests']:.0%})")
+    finally:
+        server.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Checks that PushDeduplicator suppresses a repeated push from the same account but not the same push from another
+account sharing its backend. No requests are sent; pushes go to a transport that counts them.
+
+Usage: python3 helpers/check_dedup.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spontit import SpontitResource  # noqa: E402
+from spontit.dedup import PushDeduplicator, SqliteDedupBackend  # noqa: E402
+
+
+class _CountingTransport:
+    """
+    Answers every request with a success and counts the requests.
+    """
+
+    class Response:
+        status_code = 200
+        content = b'{"data": {}}'
+
+    def __init__(self):
+        self.requests = 0
+
+    def request(self, method, url, data=None, files=None, headers=None, stream=False):
+        self.requests += 1
+        return _CountingTransport.Response()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dedup.sqlite")
+        # Each account gets its own deduplicator over the same file, as separate processes would.
+        transports = {user_id: _CountingTransport() for user_id in ("u1", "u2")}
+        resources = {user_id: SpontitResource(user_id, "key", transport=transport,
+                                              deduplicator=PushDeduplicator(60, SqliteDedupBackend(path)))
+                     for user_id, transport in transports.items()}
+
+        failures = []
+        if resources["u1"].push("server down").get("skipped"):
+            failures.append("the first push of u1 was skipped")
+        if resources["u2"].push("server down").get("skipped"):
+            failures.append("u2 was suppressed by the identical push of u1")
+        if not resources["u1"].push("server down").get("skipped"):
+            failures.append("the repeated push of u1 was not skipped")
+        sent = {user_id: transport.requests for user_id, transport in transports.items()}
+        if sent != {"u1": 1, "u2": 1}:
+            failures.append(f"expected one request per account, got {sent}")
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("Accounts sharing a backend deduplicate their own pushes without suppressing each other's.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
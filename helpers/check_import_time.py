@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Measures how long `import spontit` takes in a fresh interpreter and fails if it exceeds the startup budget or if
+any module that spontit only needs for some features (the transport dependencies, threading, concurrent.futures,
+datetime, random) was loaded eagerly.
+
+Usage: python3 helpers/check_import_time.py [--budget-ms 50] [--runs 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that must only be loaded when a feature needs them (e.g. on the first network call or when a thread pool
+# starts), never by `import spontit` itself.
+LAZY_MODULES = ("requests", "urllib3", "chardet", "charset_normalizer", "ssl", "threading", "concurrent.futures",
+                "datetime", "random")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import spontit
+elapsed = time.perf_counter() - start
+eager = [name for name in {lazy!r} if name in sys.modules]
+print(elapsed * 1000)
+print(",".join(eager))
+"""
+
+
+def measure(runs):
+    """
+    Imports spontit in `runs` fresh interpreters.
+    :param runs: the number of interpreters to start
+    :return: a tuple of (sorted import times in milliseconds, set of lazy modules that were loaded eagerly)
+    """
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = repo_root + os.pathsep + env.get("PYTHONPATH", "")
+    probe = _PROBE.format(lazy=LAZY_MODULES)
+
+    timings = []
+    eager = set()
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", probe], env=env, universal_newlines=True)
+        elapsed_line, eager_line = (output.splitlines() + [""])[:2]
+        timings.append(float(elapsed_line))
+        eager.update(name for name in eager_line.split(",") if name)
+    return sorted(timings), eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=50.0,
+                        help="maximum allowed median import time in milliseconds")
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreters to sample")
+    args = parser.parse_args()
+
+    timings, eager = measure(args.runs)
+    median = timings[len(timings) // 2]
+    print(f"import spontit: median {median:.2f} ms, min {timings[0]:.2f} ms, max {timings[-1]:.2f} ms "
+          f"over {len(timings)} runs (budget {args.budget_ms:.2f} ms)")
+
+    failed = False
+    if eager:
+        print(f"FAIL: loaded eagerly on import: {', '.join(sorted(eager))}")
+        failed = True
+    if median > args.budget_ms:
+        print("FAIL: median import time is over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,6 @@
 from spontit.resource import SpontitResource
+from spontit.transport import RequestsTransport, Urllib3Transport
+from spontit.template import PushTemplate
+from spontit.scheduler import PrioritySender
+from spontit.state import ChannelStateStore
+from spontit.provision import ChannelProvisioner, ChannelSpec
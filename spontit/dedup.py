@@ -0,0 +1,160 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryDedupBackend:
+    """
+    Remembers recently sent push fingerprints in this process. Holds at most max_entries fingerprints; when full,
+    the oldest is forgotten first.
+
+    A backend is any object with add_if_absent(key, ttl_seconds), returning True if the key was not already present
+    and unexpired (and adding it), and remove(key). Implement these over a shared store (e.g. Redis SET with NX and
+    PX) to deduplicate across machines.
+    """
+
+    def __init__(self, max_entries=100000):
+        """
+        :param max_entries: the most fingerprints to remember
+        """
+        assert type(max_entries) is int and max_entries > 0
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def add_if_absent(self, key, ttl_seconds):
+        now = time.monotonic()
+        with self.__lock:
+            # Entries are kept in insertion order, so the expired ones are at the front (for a constant TTL).
+            while self.__entries:
+                oldest_key, expires = next(iter(self.__entries.items()))
+                if expires > now:
+                    break
+                del self.__entries[oldest_key]
+
+            expires = self.__entries.get(key)
+            if expires is not None and expires > now:
+                return False
+            self.__entries.pop(key, None)
+            self.__entries[key] = now + ttl_seconds
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+            return True
+
+    def remove(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+
+class SqliteDedupBackend:
+    """
+    Remembers recently sent push fingerprints in a SQLite database, so that every process on a machine that uses the
+    same file deduplicates together.
+    """
+
+    # Expired rows are deleted once every this many additions.
+    purge_interval = 1000
+
+    def __init__(self, path):
+        """
+        :param path: the database file. It is created if it does not exist.
+        """
+        self.path = path
+        self.__local = threading.local()
+        self.__additions = 0
+        with self.__connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS spontit_dedup (key TEXT PRIMARY KEY, expires REAL)")
+
+    def __connection(self):
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = self.__local.connection = sqlite3.connect(self.path, timeout=30)
+        return connection
+
+    def add_if_absent(self, key, ttl_seconds):
+        # Wall clock time, since the rows are shared between processes.
+        now = time.time()
+        connection = self.__connection()
+        with connection:
+            connection.execute("DELETE FROM spontit_dedup WHERE key = ? AND expires <= ?", (key, now))
+            added = connection.execute("INSERT OR IGNORE INTO spontit_dedup (key, expires) VALUES (?, ?)",
+                                       (key, now + ttl_seconds)).rowcount == 1
+            self.__additions += 1
+            if self.__additions % self.purge_interval == 0:
+                connection.execute("DELETE FROM spontit_dedup WHERE expires <= ?", (now,))
+        return added
+
+    def remove(self, key):
+        connection = self.__connection()
+        with connection:
+            connection.execute("DELETE FROM spontit_dedup WHERE key = ?", (key,))
+
+
+class PushDeduplicator:
+    """
+    Suppresses pushes identical to one sent within the last window_seconds. Pass an instance to SpontitResource as
+    deduplicator; push then returns a dict with "skipped": True instead of sending a repeat.
+
+    Two pushes are identical when they are sent by the same account and their payloads are equal after
+    normalization: recipient lists are compared as sets, and for an unscheduled push the expiration timestamp (which
+    push derives from the current time) is replaced by the lifetime of the Expiration. If a push fails, its
+    fingerprint is removed again so that a retry is sent.
+    """
+
+    # Payload keys holding recipient lists, compared regardless of order and repeats.
+    RECIPIENT_KEYS = ("pushToFollowers", "pushToPhoneNumbers", "pushToEmails")
+
+    def __init__(self, window_seconds=10, backend=None):
+        """
+        :param window_seconds: how long after a push identical pushes are suppressed
+        :param backend: where fingerprints are kept. Defaults to a MemoryDedupBackend. Use a SqliteDedupBackend or
+        your own backend to deduplicate across processes.
+        """
+        assert window_seconds > 0
+        self.window_seconds = window_seconds
+        self.backend = backend if backend is not None else MemoryDedupBackend()
+
+    def fingerprint(self, payload, expiration=None, user_id=None):
+        """
+        :param payload: the payload built by SpontitResource.push
+        :param expiration: the Expiration passed to push, if any
+        :param user_id: the userId of the account sending the push, so that accounts sharing a backend do not
+        suppress each other's pushes
+        :return: a fingerprint that is equal for identical pushes
+        """
+        normalized = dict(payload)
+        if "scheduled" not in normalized and "expirationStamp" in normalized:
+            # Without a schedule the stamp depends on when push was called, so compare the lifetime instead.
+            del normalized["expirationStamp"]
+            normalized["expirationLifetime"] = \
+                expiration.get_time_stamp_from_schedule(0) if expiration is not None else None
+        for key in self.RECIPIENT_KEYS:
+            if key in normalized:
+                normalized[key] = sorted(set(normalized[key]))
+        encoded = json.dumps([user_id, normalized], sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def should_send(self, payload, expiration=None, user_id=None):
+        """
+        Records the push and reports whether it is the first within the window.
+        :param payload: the payload built by SpontitResource.push
+        :param expiration: the Expiration passed to push, if any
+        :param user_id: the userId of the account sending the push
+        :return: False if the same account sent an identical push within the window
+        """
+        return self.backend.add_if_absent(self.fingerprint(payload, expiration, user_id), self.window_seconds)
+
+    def forget(self, payload, expiration=None, user_id=None):
+        """
+        Forgets a push, e.g. because sending it failed, so that an identical push is sent again.
+        :param payload: the payload built by SpontitResource.push
+        :param expiration: the Expiration passed to push, if any
+        :param user_id: the userId of the account sending the push
+        """
+        self.backend.remove(self.fingerprint(payload, expiration, user_id))
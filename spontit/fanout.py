@@ -0,0 +1,139 @@
+import multiprocessing
+import time
+
+from spontit.resource import SpontitResource
+from spontit.transport import Urllib3Transport
+
+# The resource of the current worker process, created once by _initialize_worker.
+_worker_resource = None
+
+
+def _pooled_resource(user_id, secret_key):
+    """
+    The default resource factory. Each worker keeps its connections open between pushes.
+    """
+    return SpontitResource(user_id, secret_key, transport=Urllib3Transport())
+
+
+def _initialize_worker(resource_factory, factory_args):
+    global _worker_resource
+    _worker_resource = resource_factory(*factory_args)
+
+
+def _send_shard(task):
+    """
+    Runs in a worker process. Sends one shard of recipients in batches.
+    :param task: a tuple of (recipients encoded as newline-separated UTF-8 bytes, batch size, push keyword arguments,
+    maximum number of errors to report)
+    :return: the report of the shard
+    """
+    encoded_recipients, batch_size, push_kwargs, max_errors = task
+    recipients = encoded_recipients.decode("utf-8").split("\n")
+    report = FanOutEngine.empty_report()
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+        try:
+            response = _worker_resource.push(push_to_followers=batch, **push_kwargs)
+        except Exception as e:
+            response = e
+        report["pushes"] += 1
+        report["recipients"] += len(batch)
+        if SpontitResource._succeeded(response):
+            report["succeeded_pushes"] += 1
+        else:
+            report["failed_pushes"] += 1
+            report["failed_recipients"] += len(batch)
+            if len(report["errors"]) < max_errors:
+                report["errors"].append(str(response))
+    return report
+
+
+class FanOutEngine:
+    """
+    Sends one push to a very large list of followers using a pool of processes, so that the Python work of each
+    push (argument checks, building the payload, JSON encoding) is spread over every core instead of being limited
+    by the GIL.
+
+    The recipient list is cut into shards, and each shard is sent to a worker as a single newline-separated bytes
+    object rather than a pickled list of strings. Each worker creates its own SpontitResource once, when it starts,
+    with a pooled Urllib3Transport by default, and sends its shards in batches of batch_size followers per push.
+    The reports of the shards are merged into one.
+    """
+
+    def __init__(self, user_id, secret_key, processes=None, batch_size=1000, shard_size=None, resource_factory=None,
+                 max_errors=20):
+        """
+        :param user_id: your userId
+        :param secret_key: your secret key
+        :param processes: the number of worker processes. Defaults to the number of CPUs.
+        :param batch_size: the number of followers per push
+        :param shard_size: the number of followers handed to a worker at a time. Defaults to 10 batches, and is rounded
+        up to a whole number of batches so that only the last shard sends a partial batch. Smaller shards balance the
+        work between processes better; larger shards have less overhead.
+        :param resource_factory: a picklable function called in each worker as resource_factory(user_id, secret_key)
+        to create its resource. Defaults to a SpontitResource with an Urllib3Transport, so that each worker reuses its
+        connections.
+        :param max_errors: the maximum number of error messages kept in the report
+        """
+        assert type(batch_size) is int and batch_size > 0
+        assert shard_size is None or (type(shard_size) is int and shard_size > 0)
+        self.user_id = user_id
+        self.secret_key = secret_key
+        self.processes = processes if processes is not None else multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        if shard_size is None:
+            shard_size = batch_size * 10
+        self.shard_size = -(-shard_size // batch_size) * batch_size
+        self.resource_factory = resource_factory if resource_factory is not None else _pooled_resource
+        self.max_errors = max_errors
+
+    @staticmethod
+    def empty_report():
+        """
+        :return: a report with nothing sent
+        """
+        return {
+            "pushes": 0,
+            "recipients": 0,
+            "succeeded_pushes": 0,
+            "failed_pushes": 0,
+            "failed_recipients": 0,
+            "errors": []
+        }
+
+    def __shards(self, recipients):
+        for start in range(0, len(recipients), self.shard_size):
+            shard = "\n".join(recipients[start:start + self.shard_size])
+            if shard.count("\n") != min(self.shard_size, len(recipients) - start) - 1:
+                raise Exception("Follower userIds must not contain newlines.")
+            yield shard.encode("utf-8")
+
+    def push(self, push_to_followers, **push_kwargs):
+        """
+        Sends a push to every follower in push_to_followers.
+        :param push_to_followers: a list, tuple or set of the userIds of the followers to push to
+        :param push_kwargs: the other arguments to SpontitResource.push (e.g. content, push_title, channel_name)
+        :return: a dict with pushes, recipients, succeeded_pushes, failed_pushes, failed_recipients, errors (up to
+        max_errors error messages) and seconds
+        """
+        if "push_to_followers" in push_kwargs:
+            raise Exception("Pass the followers as the first argument.")
+        if type(push_to_followers) is set:
+            push_to_followers = list(push_to_followers)
+        assert type(push_to_followers) in (list, tuple)
+
+        started = time.perf_counter()
+        report = self.empty_report()
+        if push_to_followers:
+            tasks = ((shard, self.batch_size, push_kwargs, self.max_errors)
+                     for shard in self.__shards(push_to_followers))
+            with multiprocessing.Pool(self.processes, initializer=_initialize_worker,
+                                      initargs=(self.resource_factory, (self.user_id, self.secret_key))) as pool:
+                for shard_report in pool.imap_unordered(_send_shard, tasks):
+                    for key, value in shard_report.items():
+                        if key == "errors":
+                            report[key].extend(value[:self.max_errors - len(report[key])])
+                        else:
+                            report[key] += value
+        report["seconds"] = time.perf_counter() - started
+        return report
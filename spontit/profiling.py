@@ -0,0 +1,159 @@
+import random
+import sys
+import threading
+import time
+
+
+class PushProfiler:
+    """
+    Records how long each phase of SpontitResource.push takes, for a sampled fraction of pushes. Enable it with
+    SpontitResource.enable_profiling.
+
+    The phases, in order, are:
+        validate_and_build: checking the arguments of push and building the payload dict. push does both in the
+            same pass over its arguments, so they are timed together.
+        deduplicate: checking the push against the deduplicator of the resource, if it has one. Pushes skipped as
+            repeats are not recorded.
+        prepare_request: building the headers and URL of the request
+        serialize: encoding the payload as JSON
+        send: preparing the request in requests before it is handed to the connection
+        wait_first_byte: connecting, writing the request and waiting for the response headers
+        download: reading the response body
+        decode: decoding the response JSON
+
+    Allocation counts are the net change in allocated memory blocks (sys.getallocatedblocks) during the phase. They
+    are process-wide, so they are only exact when pushes are not sent from several threads at once.
+    """
+
+    PHASES = ("validate_and_build", "deduplicate", "prepare_request", "serialize", "send", "wait_first_byte",
+              "download", "decode")
+
+    class Sample:
+        """
+        The timings of one push. Phases are recorded back to back: each mark closes the phase that started at the
+        previous mark.
+        """
+
+        def __init__(self, profiler):
+            self.profiler = profiler
+            self.phases = []
+            self.__last_time = time.perf_counter()
+            self.__last_blocks = sys.getallocatedblocks()
+
+        def mark(self, phase):
+            """
+            Ends a phase.
+            :param phase: the name of the phase that just ended
+            """
+            now = time.perf_counter()
+            blocks = sys.getallocatedblocks()
+            self.phases.append((phase, now - self.__last_time, blocks - self.__last_blocks))
+            self.__last_time = now
+            self.__last_blocks = blocks
+
+        def mark_split(self, phase, tail_phase, tail_seconds):
+            """
+            Ends two phases at once when only the duration of the second one is known (e.g. from a timer inside
+            requests). Allocations are attributed to the first phase.
+            :param phase: the name of the first phase
+            :param tail_phase: the name of the second phase
+            :param tail_seconds: how long the second phase took
+            """
+            self.mark(phase)
+            name, seconds, blocks = self.phases[-1]
+            tail_seconds = min(max(tail_seconds, 0.0), seconds)
+            self.phases[-1] = (name, seconds - tail_seconds, blocks)
+            self.phases.append((tail_phase, tail_seconds, 0))
+
+        def finish(self):
+            """
+            Adds the sample to the profiler's summary.
+            """
+            self.profiler.record(self.phases)
+
+    def __init__(self, sample_rate=1.0):
+        """
+        :param sample_rate: the fraction of pushes to profile, between 0 and 1
+        """
+        assert 0 <= sample_rate <= 1
+        self.sample_rate = sample_rate
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Discards everything recorded so far.
+        """
+        with self.__lock:
+            self.samples = 0
+            self.__totals = {phase: [0, 0.0, 0, None, 0.0] for phase in self.PHASES}
+
+    def sample(self):
+        """
+        Decides whether to profile a push.
+        :return: a new Sample, or None if this push is not sampled
+        """
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        return PushProfiler.Sample(self)
+
+    def record(self, phases):
+        """
+        Adds the phases of one push to the summary.
+        :param phases: a list of (phase, seconds, allocated blocks) tuples
+        """
+        with self.__lock:
+            self.samples += 1
+            for phase, seconds, blocks in phases:
+                totals = self.__totals.setdefault(phase, [0, 0.0, 0, None, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] += blocks
+                totals[3] = seconds if totals[3] is None else min(totals[3], seconds)
+                totals[4] = max(totals[4], seconds)
+
+    def summary(self):
+        """
+        :return: a dict mapping each phase to a dict with count, total_seconds, mean_seconds, min_seconds,
+        max_seconds, mean_allocated_blocks and share (the fraction of all profiled time spent in the phase)
+        """
+        with self.__lock:
+            totals = {phase: list(values) for phase, values in self.__totals.items()}
+        overall = sum(values[1] for values in totals.values()) or 1.0
+        report = dict()
+        for phase, (count, seconds, blocks, minimum, maximum) in totals.items():
+            report[phase] = {
+                "count": count,
+                "total_seconds": seconds,
+                "mean_seconds": seconds / count if count else None,
+                "min_seconds": minimum,
+                "max_seconds": maximum if count else None,
+                "mean_allocated_blocks": blocks / count if count else None,
+                "share": seconds / overall
+            }
+        return report
+
+    def report(self):
+        """
+        :return: the summary formatted as a table
+        """
+        lines = [f"{self.samples} profiled pushes",
+                 f"{'phase':<20}{'count':>8}{'mean ms':>12}{'max ms':>12}{'share':>8}{'blocks':>10}"]
+        for phase, stats in self.summary().items():
+            if not stats["count"]:
+                continue
+            lines.append(f"{phase:<20}{stats['count']:>8}{stats['mean_seconds'] * 1000:>12.3f}"
+                         f"{stats['max_seconds'] * 1000:>12.3f}{stats['share']:>8.1%}"
+                         f"{stats['mean_allocated_blocks']:>10.1f}")
+        return "\n".join(lines)
+
+    def export_folded(self, path):
+        """
+        Writes the total time of each phase in the folded stack format ("push;phase microseconds" per line) read by
+        flamegraph.pl, speedscope and other flame graph tools.
+        :param path: the file to write
+        """
+        with open(path, "w") as f:
+            for phase, stats in self.summary().items():
+                if stats["count"]:
+                    f.write(f"push;{phase} {int(round(stats['total_seconds'] * 1000000))}\n")
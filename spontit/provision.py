@@ -0,0 +1,210 @@
+class ChannelSpec:
+    """
+    The desired state of one channel, for use with ChannelProvisioner.
+    """
+
+    def __init__(self, channel_name, category_code=None, add_all_followers=None, auto_add_future_followers=None,
+                 image_path=None, is_png=None):
+        """
+        :param channel_name: the name of the channel
+        :param category_code: the category code of the channel. To get a mapping of channel codes to category names,
+        call get_categories. If None, a new channel is created with category 99 and an existing one is left as it is.
+        :param add_all_followers: whether to add all followers from your main channel to this channel. If True, the
+        followers are added on every apply, which also picks up followers who joined since the last one. If None, left
+        as it is.
+        :param auto_add_future_followers: whether future followers of your main channel also follow this channel. If
+        None, left as it is.
+        :param image_path: the path to the profile image of the channel. If None, the image is left as it is.
+        :param is_png: whether the image is PNG rather than JPEG. If None, inferred from the image_path extension.
+        """
+        assert type(channel_name) is str
+        assert category_code is None or type(category_code) is int
+        self.channel_name = channel_name
+        self.category_code = category_code
+        self.add_all_followers = add_all_followers
+        self.auto_add_future_followers = auto_add_future_followers
+        self.image_path = image_path
+        if is_png is None and image_path is not None:
+            is_png = image_path.lower().endswith(".png")
+        self.is_png = is_png
+
+
+class ChannelProvisioner:
+    """
+    Brings your channels to a desired state. Give it the list of channels you want (as ChannelSpecs); it compares
+    them with get_channels, plans the minimal set of create, update, profile image upload and delete calls, and runs
+    them in parallel across channels. Calls for the same channel run in order (create, then update, then upload).
+
+    Use a SpontitResource with a ChannelStateStore to also skip settings and images that were already applied.
+    """
+
+    class Operation:
+        """
+        One planned call to the API.
+        """
+
+        CREATE = "create"
+        UPDATE = "update"
+        UPLOAD_IMAGE = "upload_image"
+        DELETE = "delete"
+
+        def __init__(self, channel_name, action, kwargs):
+            self.channel_name = channel_name
+            self.action = action
+            self.kwargs = kwargs
+
+        def __repr__(self):
+            return f"Operation({self.action} {self.channel_name!r} {self.kwargs})"
+
+    def __init__(self, resource, max_workers=8, delete_unlisted=False):
+        """
+        :param resource: an instance of SpontitResource
+        :param max_workers: the number of channels provisioned at once
+        :param delete_unlisted: whether to delete existing channels that are not in the desired set
+        """
+        assert type(max_workers) is int and max_workers > 0
+        self.resource = resource
+        self.max_workers = max_workers
+        self.delete_unlisted = delete_unlisted
+
+    @staticmethod
+    def __parse_channels(response):
+        """
+        Reads the existing channels from the response of get_channels.
+        :param response: the response of get_channels
+        :return: a dict mapping channel names to channel dicts
+        """
+        try:
+            data = response['data']
+        except (KeyError, TypeError):
+            raise Exception(f"Could not list the existing channels: {response}")
+        if type(data) is dict:
+            data = [dict(channel, channelName=channel.get("channelName", name)) if type(channel) is dict
+                    else {"channelName": name} for name, channel in data.items()]
+        channels = dict()
+        for channel in data:
+            if type(channel) is dict and "channelName" in channel:
+                channels[channel["channelName"]] = channel
+        return channels
+
+    def __image_applied(self, spec):
+        state_store = self.resource.state_store
+        if state_store is None:
+            return False
+        recorded = state_store.get_image(spec.channel_name)
+        if recorded is None or not state_store.is_fresh(recorded[1]):
+            return False
+        with open(spec.image_path, 'rb') as f:
+            image = f.read()
+        file_type = "image/png" if spec.is_png else "image/jpeg"
+        return recorded[0] == state_store.image_digest(image, file_type)
+
+    def plan(self, specs):
+        """
+        Works out which calls are needed to bring the channels to the desired state.
+        :param specs: a list of ChannelSpec
+        :return: a list of ChannelProvisioner.Operation, grouped by channel in the order they must run
+        """
+        names = [spec.channel_name for spec in specs]
+        if len(set(names)) != len(names):
+            raise Exception("Each channel may only be listed once.")
+        existing = self.__parse_channels(self.resource.get_channels())
+
+        operations = []
+        for spec in specs:
+            channel = existing.get(spec.channel_name)
+            settings = dict()
+            if channel is None:
+                operations.append(ChannelProvisioner.Operation(spec.channel_name, ChannelProvisioner.Operation.CREATE, {
+                    "category_code": spec.category_code if spec.category_code is not None else 99
+                }))
+            elif spec.category_code is not None and \
+                    channel.get("categoryCode", spec.category_code) != spec.category_code:
+                settings["category_code"] = spec.category_code
+
+            # Follower settings are not part of the channel listing, so they are always sent when specified. A
+            # state store on the resource skips auto_add_future_followers if it was already applied;
+            # add_all_followers is an action and runs on every apply.
+            if spec.add_all_followers is not None:
+                settings["add_all_followers"] = spec.add_all_followers
+            if spec.auto_add_future_followers is not None:
+                settings["auto_add_future_followers"] = spec.auto_add_future_followers
+            if settings:
+                operations.append(ChannelProvisioner.Operation(spec.channel_name, ChannelProvisioner.Operation.UPDATE,
+                                                               settings))
+
+            if spec.image_path is not None and (channel is None or not self.__image_applied(spec)):
+                operations.append(ChannelProvisioner.Operation(
+                    spec.channel_name, ChannelProvisioner.Operation.UPLOAD_IMAGE,
+                    {"image_path": spec.image_path, "is_png": spec.is_png}))
+
+        if self.delete_unlisted:
+            for channel_name in existing:
+                if channel_name not in names:
+                    operations.append(ChannelProvisioner.Operation(channel_name, ChannelProvisioner.Operation.DELETE,
+                                                                   dict()))
+        return operations
+
+    def __run(self, operation):
+        if operation.action == ChannelProvisioner.Operation.CREATE:
+            return self.resource.create_channel(operation.channel_name, **operation.kwargs)
+        if operation.action == ChannelProvisioner.Operation.UPDATE:
+            return self.resource.update_channel(operation.channel_name, **operation.kwargs)
+        if operation.action == ChannelProvisioner.Operation.UPLOAD_IMAGE:
+            return self.resource.channel_profile_image_upload(channel_name=operation.channel_name, **operation.kwargs)
+        return self.resource.delete_channel(operation.channel_name)
+
+    def __apply_channel(self, operations):
+        """
+        Runs the operations of one channel in order, stopping at the first failure. A channel whose calls were all
+        skipped by the state store is reported as unchanged.
+        :return: the outcome of the channel
+        """
+        outcome = {
+            "status": "ok",
+            "operations": []
+        }
+        for operation in operations:
+            try:
+                response = self.__run(operation)
+            except Exception as e:
+                response = e
+            outcome["operations"].append((operation.action, response))
+            if not self.resource._succeeded(response):
+                outcome["status"] = "failed"
+                return outcome
+        if all(response.get("skipped") for _, response in outcome["operations"]):
+            outcome["status"] = "unchanged"
+        return outcome
+
+    def apply(self, specs, dry_run=False):
+        """
+        Brings the channels to the desired state.
+        :param specs: a list of ChannelSpec
+        :param dry_run: whether to only plan, without making any changes
+        :return: a dict with "plan" (the list of operations) and "results" (a dict mapping each channel name to its
+        outcome: "status" is "ok", "unchanged", "failed" or "planned", and "operations" lists (action, response)
+        tuples for the calls made)
+        """
+        operations = self.plan(specs)
+        by_channel = dict()
+        for operation in operations:
+            by_channel.setdefault(operation.channel_name, []).append(operation)
+
+        results = {spec.channel_name: {"status": "unchanged", "operations": []} for spec in specs}
+        if dry_run:
+            for channel_name in by_channel:
+                results[channel_name] = {"status": "planned", "operations": []}
+        elif by_channel:
+            # Imported here so that importing spontit does not load concurrent.futures.
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(by_channel))) as executor:
+                futures = {channel_name: executor.submit(self.__apply_channel, channel_operations)
+                           for channel_name, channel_operations in by_channel.items()}
+                for channel_name, future in futures.items():
+                    results[channel_name] = future.result()
+        return {
+            "plan": operations,
+            "results": results
+        }
@@ -0,0 +1,259 @@
+import base64
+import gzip
+import json
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from spontit.transport import RequestsTransport
+
+
+class RecordedResponse:
+    """
+    A response served from a traffic log.
+    """
+
+    def __init__(self, status_code, content, elapsed, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.elapsed = timedelta(seconds=elapsed)
+        self.headers = headers if headers is not None else dict()
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def __repr__(self):
+        return f"<RecordedResponse [{self.status_code}]>"
+
+
+def _open_log(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _encode_body(body):
+    """
+    :param body: bytes, str or None
+    :return: a tuple of (JSON-safe body, encoding), where encoding is "text", "base64" or None
+    """
+    if body is None:
+        return None, None
+    if type(body) is str:
+        return body, "text"
+    try:
+        return body.decode("utf-8"), "text"
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode("ascii"), "base64"
+
+
+def _decode_body(body, encoding):
+    if encoding is None:
+        return None
+    if encoding == "base64":
+        return base64.b64decode(body)
+    return body.encode("utf-8")
+
+
+def load_log(path):
+    """
+    Reads a traffic log written by RecordingTransport.
+    :param path: the path of the log. Logs ending in .gz are gzip compressed.
+    :return: a list of records, in the order the requests were sent
+    """
+    with _open_log(path, "r") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    # Lines are written when responses arrive, and several sessions or processes may append to the same log, so
+    # order by the time each request was sent.
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+class RecordingTransport:
+    """
+    Wraps another transport and appends every request and response to a log on disk: the wall clock time the request
+    was sent, method, path, request and response sizes and bodies, status code and latency. Authentication headers
+    are never recorded. Uploaded files are recorded by size only.
+
+    The log has one JSON object per line; give the path a .gz extension to compress it. Serve it back with
+    ReplayTransport or re-send it against a stub server with TrafficReplayer.
+    """
+
+    def __init__(self, path, transport=None):
+        """
+        :param path: the log to append to
+        :param transport: the transport that sends the requests. Defaults to RequestsTransport.
+        """
+        self.path = path
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.__lock = threading.Lock()
+        self.__file = _open_log(path, "a")
+
+    def request(self, method, url, data=None, files=None, headers=None, stream=False):
+        # Wall clock time rather than time since this transport was created, so that sessions appended to the same
+        # log stay in order.
+        sent_at = time.time()
+        started = time.perf_counter()
+        response = self.transport.request(method, url, data=data, files=files, headers=headers, stream=stream)
+        content = response.content
+        elapsed = time.perf_counter() - started
+
+        if files is None:
+            request_body, request_encoding = _encode_body(data)
+            request_bytes = len(data.encode("utf-8") if type(data) is str else data) if data is not None else 0
+        else:
+            request_body, request_encoding = None, None
+            request_bytes = sum(len(spec[1]) for spec in files.values()
+                                if type(spec) is tuple and type(spec[1]) in (bytes, str))
+        response_body, response_encoding = _encode_body(content)
+        record = {
+            "t": round(sent_at, 6),
+            "method": method,
+            "path": urlsplit(url).path,
+            "requestBytes": request_bytes,
+            "requestBody": request_body,
+            "requestEncoding": request_encoding,
+            "files": files is not None,
+            "status": response.status_code,
+            "responseBytes": len(content),
+            "responseBody": response_body,
+            "responseEncoding": response_encoding,
+            "contentType": response.headers.get("Content-Type"),
+            "elapsed": round(elapsed, 6)
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.__lock:
+            self.__file.write(line)
+            self.__file.flush()
+        return response
+
+    def close(self):
+        """
+        Closes the log.
+        """
+        with self.__lock:
+            self.__file.close()
+
+
+class ReplayTransport:
+    """
+    A deterministic fake of the API served from a traffic log. Each request gets the next recorded response for the
+    same method and path, after sleeping for the recorded latency divided by speed.
+    """
+
+    def __init__(self, path, speed=1.0, loop=True):
+        """
+        :param path: a log written by RecordingTransport
+        :param speed: how many times faster than recorded to respond, e.g. 10 for a tenth of the latency. None or 0
+        to respond immediately.
+        :param loop: whether to start again from the first recorded response for a method and path once they are
+        used up. If False, running out raises an Exception.
+        """
+        self.speed = speed
+        self.loop = loop
+        self.__lock = threading.Lock()
+        self.__responses = dict()
+        self.__positions = dict()
+        for record in load_log(path):
+            self.__responses.setdefault((record["method"], record["path"]), []).append(record)
+
+    def request(self, method, url, data=None, files=None, headers=None, stream=False):
+        key = (method, urlsplit(url).path)
+        with self.__lock:
+            records = self.__responses.get(key)
+            if not records:
+                raise Exception(f"The traffic log has no responses for {method} {key[1]}.")
+            position = self.__positions.get(key, 0)
+            if position >= len(records):
+                if not self.loop:
+                    raise Exception(f"The traffic log has run out of responses for {method} {key[1]}.")
+                position = 0
+            self.__positions[key] = position + 1
+        record = records[position]
+
+        if self.speed:
+            time.sleep(record["elapsed"] / self.speed)
+        headers = {"Content-Type": record["contentType"]} if record.get("contentType") else None
+        return RecordedResponse(record["status"], _decode_body(record["responseBody"], record["responseEncoding"]),
+                                record["elapsed"], headers)
+
+
+class TrafficReplayer:
+    """
+    Re-sends the requests of a traffic log against another server (e.g. a local stub of the API), keeping the
+    recorded gaps between requests divided by speed, so that the arrival pattern and concurrency of production
+    traffic can be reproduced at 1x, 10x or 100x. Gaps between recording sessions appended to the same log are kept
+    too. File uploads are skipped because their bodies are not recorded.
+    """
+
+    def __init__(self, path, base_url, speed=1.0, max_concurrency=64, transport=None, headers=None):
+        """
+        :param path: a log written by RecordingTransport
+        :param base_url: the scheme and host to send to, e.g. "http://localhost:8080". Recorded paths are appended.
+        :param speed: how many times faster than recorded to send the requests
+        :param max_concurrency: the maximum number of requests in flight
+        :param transport: the transport to send with. Defaults to RequestsTransport.
+        :param headers: headers to send with every request (e.g. test credentials)
+        """
+        assert speed > 0
+        self.records = [record for record in load_log(path) if not record.get("files")]
+        self.base_url = base_url.rstrip("/")
+        self.speed = speed
+        self.max_concurrency = max_concurrency
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.headers = headers
+
+    def __send(self, record):
+        started = time.perf_counter()
+        try:
+            response = self.transport.request(record["method"], self.base_url + record["path"],
+                                              data=_decode_body(record["requestBody"], record["requestEncoding"]),
+                                              headers=self.headers)
+            len(response.content)
+            status = response.status_code
+        except Exception:
+            status = None
+        return record["elapsed"], time.perf_counter() - started, status
+
+    @staticmethod
+    def __percentiles(values):
+        values = sorted(values)
+        if not values:
+            return None
+        return {
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+            "max": values[-1]
+        }
+
+    def run(self):
+        """
+        Replays the log.
+        :return: a dict with requests, errors (requests that raised or got no status), seconds (wall time), and
+        recorded_latency and replayed_latency (p50, p95, p99 and max in seconds)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        started = time.monotonic()
+        futures = []
+        first = self.records[0]["t"] if self.records else 0.0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for record in self.records:
+                delay = (record["t"] - first) / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self.__send, record))
+            results = [future.result() for future in futures]
+        return {
+            "requests": len(results),
+            "errors": sum(1 for _, _, status in results if status is None),
+            "seconds": time.monotonic() - started,
+            "recorded_latency": self.__percentiles([recorded for recorded, _, _ in results]),
+            "replayed_latency": self.__percentiles([replayed for _, replayed, _ in results])
+        }
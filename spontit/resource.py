@@ -1,7 +1,8 @@
 import json
 import time
 from enum import Enum
-import requests
+
+from spontit.transport import RequestsTransport
 
 
 class SpontitResource:
@@ -41,7 +42,7 @@ class SpontitResource:
             """
             return schedule_time_stamp + self.days * 24 * 60 * 60 + self.hours * 60 * 60 + self.minutes * 60
 
-    def __init__(self, user_id, secret_key):
+    def __init__(self, user_id, secret_key, state_store=None, transport=None, deduplicator=None):
         """
         Initializes the Spontit Resource.
         :param user_id: Your userId. You can find this on the Profile tab of the iOS Spontit app or
@@ -49,6 +50,13 @@ class SpontitResource:
         :param secret_key: Your secret key. To create a secret key, go to spontit.com/secret_keys. Sign in / sign up
         and then click "Add Key" after being redirected to the page. If the redirect fails after signing in, re-enter
         spontit.com/secret_keys.
+        :param state_store: an optional ChannelStateStore. If provided, create_channel, update_channel and
+        channel_profile_image_upload skip calls that would re-apply what was last applied (see their force parameter).
+        :param transport: the transport that sends the HTTP requests. Defaults to RequestsTransport. Use a
+        RecordingTransport or ReplayTransport from spontit.replay to record traffic or to serve it back offline, or
+        Urllib3Transport for lower per-request CPU overhead.
+        :param deduplicator: an optional PushDeduplicator from spontit.dedup. If provided, push skips pushes identical
+        to one sent within its window.
         """
         if type(user_id) is not str:
             raise Exception("User ID must be a string.")
@@ -56,16 +64,26 @@ class SpontitResource:
             raise Exception("Secret key must be a string.")
         self.user_id = user_id
         self.secret_key = secret_key
+        self.__headers = None
+        self.state_store = state_store
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.deduplicator = deduplicator
+        self.profiler = None
 
     def _get_headers(self):
         """
-        Get the headers with the appropriate authentication parameters
+        Get the headers with the appropriate authentication parameters. The same dict is returned until user_id or
+        secret_key change, so it must not be modified.
         :return: The headers
         """
-        return {
-            'X-UserId': self.user_id,
-            'X-Authorization': self.secret_key
-        }
+        headers = self.__headers
+        if headers is None or headers['X-UserId'] is not self.user_id or \
+                headers['X-Authorization'] is not self.secret_key:
+            headers = self.__headers = {
+                'X-UserId': self.user_id,
+                'X-Authorization': self.secret_key
+            }
+        return headers
 
     def _request(self, payload, endpoint, request_method, files=None, headers=None):
         """
@@ -81,14 +99,14 @@ class SpontitResource:
             headers = self._get_headers()
 
         if files is None:
-            r = requests.request(
+            r = self.transport.request(
                 request_method.value,
                 url=self.__url + endpoint,
                 data=json.dumps(payload),
                 headers=headers
             )
         else:
-            r = requests.request(
+            r = self.transport.request(
                 request_method.value,
                 url=self.__url + endpoint,
                 data=payload,
@@ -101,6 +119,101 @@ class SpontitResource:
             return r
         return json_content
 
+    def _profiled_request(self, payload, endpoint, request_method, sample):
+        """
+        Makes the same JSON request as _request, recording each phase in a PushProfiler sample.
+        :param payload: the payload containing the parameters
+        :param endpoint: the desired endpoint
+        :param request_method: the method (e.g. POST, GET, PATCH, DELETE)
+        :param sample: the PushProfiler.Sample to record into
+        :return: the decoded response, or the response object if it is not JSON
+        """
+        headers = self._get_headers()
+        url = self.__url + endpoint
+        sample.mark("prepare_request")
+        data = json.dumps(payload)
+        sample.mark("serialize")
+        r = self.transport.request(request_method.value, url=url, data=data, headers=headers, stream=True)
+        sample.mark_split("send", "wait_first_byte", r.elapsed.total_seconds())
+        content = r.content
+        sample.mark("download")
+        try:
+            json_content = json.loads(content)
+        except json.decoder.JSONDecodeError:
+            json_content = r
+        sample.mark("decode")
+        sample.finish()
+        return json_content
+
+    def enable_profiling(self, sample_rate=1.0):
+        """
+        Starts recording per-phase timings of push. When profiling is disabled, push does not pay for it beyond one
+        attribute check.
+        :param sample_rate: the fraction of pushes to profile, between 0 and 1
+        :return: the PushProfiler. Call its report or export_folded functions to see the results.
+        """
+        from spontit.profiling import PushProfiler
+        self.profiler = PushProfiler(sample_rate)
+        return self.profiler
+
+    def disable_profiling(self):
+        """
+        Stops recording timings of push.
+        :return: the PushProfiler that was recording, or None
+        """
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    @staticmethod
+    def _succeeded(response):
+        """
+        :param response: the value returned by _request
+        :return: whether the response is a decoded JSON object without an error
+        """
+        return type(response) is dict and "error" not in response and "errors" not in response
+
+    @staticmethod
+    def _skipped(message):
+        """
+        The value returned in place of a response when a call is skipped because it would not change anything.
+        :param message: why the call was skipped
+        :return: the skip result
+        """
+        return {
+            "skipped": True,
+            "message": message
+        }
+
+    def _settings_applied(self, channel_name, settings):
+        """
+        Checks whether the state store says that the settings are already applied to the channel. If the record is
+        older than the store's TTL, it is re-verified against get_channel first; settings that get_channel does not
+        return count as not applied.
+        :param channel_name: the channel name, or None for the main channel
+        :param settings: the desired settings, keyed by their payload names (e.g. "categoryCode")
+        :return: whether the settings can be skipped
+        """
+        if self.state_store is None:
+            return False
+        recorded = self.state_store.get_settings(channel_name)
+        if recorded is None:
+            return False
+        applied, applied_at = recorded
+        if any(key not in applied or applied[key] != value for key, value in settings.items()):
+            return False
+        if self.state_store.is_fresh(applied_at):
+            return True
+
+        response = self.get_channel(channel_name)
+        channel = response.get("data") if type(response) is dict else None
+        # Settings the API does not return (e.g. autoAddFutureFollowers) cannot be verified, so they are re-sent.
+        if type(channel) is not dict or any(key not in channel or channel[key] != value
+                                            for key, value in applied.items()):
+            self.state_store.forget(channel_name)
+            return False
+        self.state_store.touch_settings(channel_name)
+        return True
+
     def get_categories(self):
         """
         Gets a list of categories that you can use when creating a new channel.
@@ -112,19 +225,27 @@ class SpontitResource:
             request_method=self.RequestMethod.GET
         )
 
-    def create_channel(self, channel_name, category_code=99):
+    def create_channel(self, channel_name, category_code=99, force=False):
         """
         Creates a new channel. You will then be able to push and invite to this channel separately from your main
         account.
         :param channel_name: the name of the new channel you want to create
         :param category_code: the category code that defines the category of your channel. default is 99. to get a
         mapping of channel codes to category names, call get_categories
-        :return: the new channel
+        :param force: whether to make the call even if the state store records the channel as already created with
+        this category
+        :return: the new channel, or a dict with "skipped": True if the call was skipped
         """
         assert type(category_code) is int
         assert type(channel_name) is str
 
-        return self._request(
+        settings = {
+            "categoryCode": category_code
+        }
+        if not force and self._settings_applied(channel_name, settings):
+            return self._skipped("The channel already exists with this category.")
+
+        response = self._request(
             payload={
                 "channelName": channel_name,
                 "categoryCode": category_code
@@ -132,6 +253,9 @@ class SpontitResource:
             endpoint="channel",
             request_method=self.RequestMethod.POST
         )
+        if self.state_store is not None and self._succeeded(response):
+            self.state_store.record_settings(channel_name, settings)
+        return response
 
     def delete_channel(self, channel_name):
         """
@@ -139,6 +263,8 @@ class SpontitResource:
         :param channel_name: the name of the channel to delete
         :return: the response of the request
         """
+        if self.state_store is not None:
+            self.state_store.forget(channel_name)
         return self._request(
             payload={
                 "channelName": channel_name
@@ -151,32 +277,45 @@ class SpontitResource:
                        channel_name,
                        add_all_followers=None,
                        auto_add_future_followers=None,
-                       category_code=None):
+                       category_code=None,
+                       force=False):
         """
         Updates the channel.
         :param channel_name: the name of the channel to change
-        :param add_all_followers: whether to add all followers from your main channel to this channel
+        :param add_all_followers: whether to add all followers from your main channel to this channel. This is an
+        action rather than a setting (followers who join later are only added by calling it again), so a call that
+        sets it is never skipped by the state store.
         :param auto_add_future_followers: whether to add all followers to the main channel (your account) to this
         channel as well (so that they follow both channels)
         :param category_code: the category code to change. List available categories with the get_categories function
-        :return: the new channel item
+        :param force: whether to make the call even if the state store records these settings as already applied
+        :return: the new channel item, or a dict with "skipped": True if the call was skipped
         """
+        settings = dict()
+
+        if auto_add_future_followers is not None:
+            settings['autoAddFutureFollowers'] = auto_add_future_followers
+        if category_code is not None:
+            settings['categoryCode'] = category_code
+
+        if not force and settings and add_all_followers is None and self._settings_applied(channel_name, settings):
+            return self._skipped("The channel already has these settings.")
+
         payload = {
             "channelName": channel_name
         }
-
         if add_all_followers is not None:
             payload['addAllFollowers'] = add_all_followers
-        if auto_add_future_followers is not None:
-            payload['autoAddFutureFollowers'] = auto_add_future_followers
-        if category_code is not None:
-            payload['categoryCode'] = category_code
+        payload.update(settings)
 
-        return self._request(
+        response = self._request(
             payload=payload,
             endpoint="channel",
             request_method=self.RequestMethod.PATCH
         )
+        if self.state_store is not None and settings and self._succeeded(response):
+            self.state_store.record_settings(channel_name, settings)
+        return response
 
     def get_channel(self, channel_name=None):
         """
@@ -209,21 +348,32 @@ class SpontitResource:
             request_method=self.RequestMethod.GET
         )
 
-    def channel_profile_image_upload(self, image_path, is_png, channel_name=None):
+    def channel_profile_image_upload(self, image_path, is_png, channel_name=None, force=False):
         """
         :param image_path: the path to the image
         :param is_png: whether or not the image is PNG or JPEG
         :param channel_name: the channel name of the channel whose profile image is being changed. if None, the user
         account's profile image will change
-        :return: the response from the request
+        :param force: whether to upload even if the state store records this exact image as the current one
+        :return: the response from the request, or a dict with "skipped": True if the upload was skipped
         """
 
         file_type = "image/jpeg"
         if is_png:
             file_type = "image/png"
 
+        with open(image_path, 'rb') as f:
+            image = f.read()
+
+        digest = None
+        if self.state_store is not None:
+            digest = self.state_store.image_digest(image, file_type)
+            recorded = self.state_store.get_image(channel_name)
+            if not force and recorded is not None and recorded[0] == digest and self.state_store.is_fresh(recorded[1]):
+                return self._skipped("The channel already has this profile image.")
+
         files = {
-            'image': ("my_file_name", open(image_path, 'rb'), file_type)
+            'image': ("my_file_name", image, file_type)
         }
 
         if channel_name is None:
@@ -233,12 +383,15 @@ class SpontitResource:
                 "channelName": channel_name
             }
 
-        return self._request(
+        response = self._request(
             payload=payload,
             endpoint="channel/profile_image",
             request_method=self.RequestMethod.POST,
             files=files
         )
+        if digest is not None and self._succeeded(response):
+            self.state_store.record_image(channel_name, digest)
+        return response
 
     def list_followers(self, channel_name=None):
         # Construct the payload.
@@ -300,8 +453,11 @@ class SpontitResource:
         where the user can comment or whether the notification should open within the user's home feed.
         :param ios_deep_link: A deep link to another iOS app of the format *://*. Only for iOS versions >= v6.0.1.
         :param channel_name: The name of your channel
-        :return: The result of the call, either with an error or with a result.
+        :return: The result of the call, either with an error or with a result. If the resource has a deduplicator
+        and an identical push was sent within its window, a dict with "skipped": True instead.
         """
+        sample = self.profiler.sample() if self.profiler is not None else None
+
         # Construct the payload.
         payload = dict()
 
@@ -371,6 +527,41 @@ class SpontitResource:
             assert type(channel_name) == str
             payload["channelName"] = channel_name
 
+        if sample is not None:
+            sample.mark("validate_and_build")
+
+        if self.deduplicator is not None:
+            should_send = self.deduplicator.should_send(payload, expiration, self.user_id)
+            if sample is not None:
+                sample.mark("deduplicate")
+            if not should_send:
+                return self._skipped("An identical push was sent within the deduplication window.")
+            try:
+                response = self.__send_push(payload, sample)
+            except Exception:
+                self.deduplicator.forget(payload, expiration, self.user_id)
+                raise
+            if not self._succeeded(response):
+                self.deduplicator.forget(payload, expiration, self.user_id)
+            return response
+
+        return self.__send_push(payload, sample)
+
+    def __send_push(self, payload, sample):
+        """
+        Sends a push payload built by push.
+        :param payload: the payload
+        :param sample: the PushProfiler.Sample of the push, or None if it is not being profiled
+        :return: the result of the call
+        """
+        if sample is not None:
+            return self._profiled_request(
+                payload=payload,
+                endpoint="push",
+                request_method=SpontitResource.RequestMethod.POST,
+                sample=sample
+            )
+
         return self._request(
             payload=payload,
             endpoint="push",
@@ -0,0 +1,290 @@
+import time
+from collections import deque
+
+
+class PrioritySender:
+    """
+    Sends pushes through a SpontitResource from named priority lanes (e.g. time-critical alerts and bulk
+    campaigns), so that a large backlog in one lane does not delay the others.
+
+    Each lane has its own queue, a number of worker threads reserved for it, an optional share of the request rate,
+    and a weight. Free workers pick the next push by weighted fair queueing across the lanes that have work waiting.
+    While a preemptive lane has pushes waiting, non-preemptive lanes are held to their reserved workers, so bulk
+    work yields to alerts at the next push boundary (a request already on the wire is never interrupted).
+    """
+
+    class TokenBucket:
+        """
+        A rate limit. Holds up to one second of its rate in tokens (and at least one), and each push takes one.
+        """
+
+        def __init__(self, requests_per_second):
+            """
+            :param requests_per_second: the rate, or None for no limit
+            """
+            self.requests_per_second = requests_per_second
+            self.tokens = 1.0
+            self.updated = time.monotonic()
+
+        def refill(self, now):
+            """
+            Adds the tokens earned since the last refill.
+            :param now: the current time.monotonic()
+            """
+            if self.requests_per_second is None:
+                return
+            self.tokens = min(max(1.0, self.requests_per_second),
+                              self.tokens + (now - self.updated) * self.requests_per_second)
+            self.updated = now
+
+        def has_token(self):
+            return self.requests_per_second is None or self.tokens >= 1.0
+
+        def seconds_until_token(self):
+            if self.has_token():
+                return 0.0
+            return (1.0 - self.tokens) / self.requests_per_second
+
+        def take(self):
+            if self.requests_per_second is not None:
+                self.tokens -= 1.0
+
+    class Lane:
+        """
+        A priority class. Create lanes with PrioritySender.add_lane.
+        """
+
+        # Number of recent queue latencies kept per lane for the metrics.
+        latency_window = 1024
+
+        def __init__(self, name, weight, reserved_concurrency, rate_share, requests_per_second, preemptive,
+                     slo_seconds):
+            self.name = name
+            self.weight = weight
+            self.reserved_concurrency = reserved_concurrency
+            self.rate_share = rate_share
+            self.bucket = PrioritySender.TokenBucket(requests_per_second)
+            self.preemptive = preemptive
+            self.slo_seconds = slo_seconds
+            self.queue = deque()
+            self.in_flight = 0
+            self.sent = 0
+            self.failed = 0
+            self.virtual_time = 0.0
+            self.latencies = deque(maxlen=self.latency_window)
+
+    def __init__(self, resource, max_concurrency=8, requests_per_second=None):
+        """
+        Initializes the sender. Add lanes with add_lane and then call start.
+        :param resource: an instance of SpontitResource
+        :param max_concurrency: the total number of pushes that may be in flight at once, across all lanes
+        :param requests_per_second: the total request rate across all lanes, or None for no limit. Lanes given a
+        rate_share are further limited to that fraction of this rate; lanes without one share whatever the others
+        leave.
+        """
+        assert type(max_concurrency) is int and max_concurrency > 0
+        self.resource = resource
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.__bucket = PrioritySender.TokenBucket(requests_per_second)
+        self.__lanes = dict()
+        # Imported here so that importing spontit does not load threading.
+        import threading
+
+        self.__condition = threading.Condition()
+        self.__workers = []
+        self.__running = False
+
+    def add_lane(self, name, weight=1, reserved_concurrency=0, rate_share=None, preemptive=False, slo_seconds=None):
+        """
+        Adds a priority lane.
+        :param name: the name used to submit to the lane, e.g. "alerts" or "bulk"
+        :param weight: the lane's share of the free workers relative to the other lanes with work waiting. A lane of
+        weight 4 is dispatched four times as often as a lane of weight 1 while both are backlogged.
+        :param reserved_concurrency: the number of workers only this lane may use
+        :param rate_share: the fraction of the sender's requests_per_second this lane may use, or None for no limit
+        :param preemptive: whether waiting pushes in this lane hold other lanes to their reserved workers
+        :param slo_seconds: the target queue latency for this lane. Reported against in metrics.
+        :return: the new lane
+        """
+        if name in self.__lanes:
+            raise Exception(f"A lane named \"{name}\" already exists.")
+        assert weight > 0
+        assert type(reserved_concurrency) is int and reserved_concurrency >= 0
+        reserved_total = sum(lane.reserved_concurrency for lane in self.__lanes.values()) + reserved_concurrency
+        if reserved_total > self.max_concurrency:
+            raise Exception("The lanes reserve more workers than max_concurrency allows.")
+        lane_rate = None
+        if rate_share is not None:
+            if self.requests_per_second is None:
+                raise Exception("A rate_share requires requests_per_second to be set on the sender.")
+            assert 0 < rate_share <= 1
+            shares = sum(lane.rate_share for lane in self.__lanes.values() if lane.rate_share is not None)
+            if shares + rate_share > 1:
+                raise Exception("The rate shares of the lanes add up to more than 1.")
+            lane_rate = self.requests_per_second * rate_share
+
+        with self.__condition:
+            lane = PrioritySender.Lane(name, weight, reserved_concurrency, rate_share, lane_rate, preemptive,
+                                       slo_seconds)
+            self.__lanes[name] = lane
+        return lane
+
+    def start(self):
+        """
+        Starts the worker threads.
+        """
+        if not self.__lanes:
+            raise Exception("Add at least one lane before starting the sender.")
+        with self.__condition:
+            if self.__running:
+                return
+            self.__running = True
+        import threading
+
+        for index in range(self.max_concurrency):
+            worker = threading.Thread(target=self.__work, name=f"spontit-priority-sender-{index}", daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker threads once every queued push has been sent.
+        :param wait: whether to block until the workers have finished
+        """
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify_all()
+        if wait:
+            for worker in self.__workers:
+                worker.join()
+        self.__workers = []
+
+    def submit(self, lane_name, **push_kwargs):
+        """
+        Queues a push in a lane. The sender must be started and not shut down.
+        :param lane_name: the name of the lane
+        :param push_kwargs: the arguments to SpontitResource.push
+        :return: a concurrent.futures.Future that resolves to the response of the push
+        """
+        # Imported here so that importing spontit does not load concurrent.futures.
+        from concurrent.futures import Future
+
+        future = Future()
+        with self.__condition:
+            if not self.__running:
+                raise Exception("The sender is not running. Call start before submitting pushes.")
+            try:
+                lane = self.__lanes[lane_name]
+            except KeyError:
+                raise Exception(f"There is no lane named \"{lane_name}\".")
+            if not lane.queue and not lane.in_flight:
+                # A lane that was idle starts level with the busiest lanes instead of spending credit it saved up.
+                backlogged = [other.virtual_time for other in self.__lanes.values() if other.queue]
+                if backlogged:
+                    lane.virtual_time = max(lane.virtual_time, min(backlogged))
+            lane.queue.append((time.monotonic(), push_kwargs, future))
+            self.__condition.notify()
+        return future
+
+    def metrics(self):
+        """
+        Reports the state of every lane. Latencies are the time pushes spent queued before a worker picked them up,
+        over the most recent pushes.
+        :return: a dict mapping lane names to dicts with queued, in_flight, sent, failed, p50_seconds, p95_seconds,
+        max_seconds, slo_seconds and within_slo (the fraction of recent pushes that met the SLO, or None)
+        """
+        with self.__condition:
+            lanes = [(lane, sorted(lane.latencies)) for lane in self.__lanes.values()]
+            report = dict()
+            for lane, latencies in lanes:
+                within_slo = None
+                if lane.slo_seconds is not None and latencies:
+                    within_slo = sum(1 for latency in latencies if latency <= lane.slo_seconds) / len(latencies)
+                report[lane.name] = {
+                    "queued": len(lane.queue),
+                    "in_flight": lane.in_flight,
+                    "sent": lane.sent,
+                    "failed": lane.failed,
+                    "p50_seconds": latencies[len(latencies) // 2] if latencies else None,
+                    "p95_seconds": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies
+                    else None,
+                    "max_seconds": latencies[-1] if latencies else None,
+                    "slo_seconds": lane.slo_seconds,
+                    "within_slo": within_slo
+                }
+        return report
+
+    def __can_dispatch(self, lane, shared_free, preempting):
+        if not lane.queue or not lane.bucket.has_token():
+            return False
+        if lane.in_flight < lane.reserved_concurrency:
+            return True
+        if preempting and not lane.preemptive:
+            return False
+        return shared_free > 0
+
+    def __next(self):
+        """
+        Picks the next push to send. Must be called with the condition held.
+        :return: (lane, queued item), or (None, seconds to wait before a rate-limited lane has a token)
+        """
+        now = time.monotonic()
+        lanes = list(self.__lanes.values())
+        self.__bucket.refill(now)
+        if not self.__bucket.has_token():
+            return None, self.__bucket.seconds_until_token() if any(lane.queue for lane in lanes) else None
+
+        shared_in_use = 0
+        for lane in lanes:
+            lane.bucket.refill(now)
+            shared_in_use += max(0, lane.in_flight - lane.reserved_concurrency)
+        shared_free = self.max_concurrency - sum(lane.reserved_concurrency for lane in lanes) - shared_in_use
+        preempting = any(lane.preemptive and lane.queue for lane in lanes)
+
+        chosen = None
+        for lane in lanes:
+            if self.__can_dispatch(lane, shared_free, preempting) and \
+                    (chosen is None or lane.virtual_time < chosen.virtual_time):
+                chosen = lane
+        if chosen is None:
+            waits = [lane.bucket.seconds_until_token() for lane in lanes if lane.queue and not lane.bucket.has_token()]
+            return None, min(waits) if waits else None
+
+        self.__bucket.take()
+        chosen.bucket.take()
+        chosen.virtual_time += 1.0 / chosen.weight
+        chosen.in_flight += 1
+        return chosen, chosen.queue.popleft()
+
+    def __work(self):
+        while True:
+            with self.__condition:
+                while True:
+                    lane, item = self.__next()
+                    if lane is not None:
+                        break
+                    if not self.__running and not any(other.queue for other in self.__lanes.values()):
+                        return
+                    self.__condition.wait(item)
+
+            enqueued, push_kwargs, future = item
+            latency = time.monotonic() - enqueued
+            succeeded = None
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(self.resource.push(**push_kwargs))
+                    succeeded = True
+                except Exception as e:
+                    future.set_exception(e)
+                    succeeded = False
+
+            with self.__condition:
+                lane.in_flight -= 1
+                if succeeded is not None:
+                    lane.latencies.append(latency)
+                    if succeeded:
+                        lane.sent += 1
+                    else:
+                        lane.failed += 1
+                self.__condition.notify_all()
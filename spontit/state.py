@@ -0,0 +1,141 @@
+import json
+import os
+import time
+
+
+class ChannelStateStore:
+    """
+    Remembers what was last applied to each channel (its settings and the digest of its profile image) so that
+    SpontitResource can skip create_channel, update_channel and channel_profile_image_upload calls that would not
+    change anything. Pass an instance to SpontitResource as state_store.
+
+    The state is kept in memory and, if a path is given, saved as JSON after every change so that it survives
+    between deploys.
+    """
+
+    # The key used for the main channel (your account), which has no channel name.
+    MAIN_CHANNEL = ""
+
+    def __init__(self, path=None, ttl_seconds=None):
+        """
+        Initializes the store.
+        :param path: a JSON file to load the state from and save it to. If None, the state only lives in memory.
+        :param ttl_seconds: how long recorded state is trusted. Once it is older than this, channel settings are
+        re-verified against get_channel and profile images are uploaded again. If None, state never expires.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        # Imported here so that importing spontit does not load threading.
+        import threading
+
+        self.__lock = threading.Lock()
+        self.__channels = dict()
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                self.__channels = json.load(f)
+
+    @staticmethod
+    def digest(data):
+        """
+        :param data: bytes to hash
+        :return: the hex SHA-256 digest of the data
+        """
+        # Imported here because hashlib loads OpenSSL, which import spontit should not pay for.
+        import hashlib
+
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def image_digest(image, file_type):
+        """
+        :param image: the bytes of a profile image
+        :param file_type: the MIME type the image is uploaded as
+        :return: the digest recorded for the image
+        """
+        return ChannelStateStore.digest(file_type.encode() + b"\0" + image)
+
+    @staticmethod
+    def __key(channel_name):
+        return ChannelStateStore.MAIN_CHANNEL if channel_name is None else channel_name
+
+    def __save(self):
+        if self.path is None:
+            return
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self.__channels, f, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+    def is_fresh(self, applied_at):
+        """
+        :param applied_at: the epoch timestamp at which some state was recorded
+        :return: whether the state is still within the TTL
+        """
+        return self.ttl_seconds is None or time.time() - applied_at < self.ttl_seconds
+
+    def get_settings(self, channel_name):
+        """
+        :param channel_name: the channel name, or None for the main channel
+        :return: a tuple of (dict of the last applied settings keyed by their payload names, epoch timestamp at which
+        they were applied), or None if nothing has been recorded for the channel
+        """
+        with self.__lock:
+            channel = self.__channels.get(self.__key(channel_name))
+            if channel is None or "settings" not in channel:
+                return None
+            return dict(channel["settings"]), channel["settingsAppliedAt"]
+
+    def record_settings(self, channel_name, settings):
+        """
+        Records settings that were successfully applied, merging them into the settings already recorded.
+        :param channel_name: the channel name, or None for the main channel
+        :param settings: a dict of the applied settings keyed by their payload names (e.g. "categoryCode")
+        """
+        with self.__lock:
+            channel = self.__channels.setdefault(self.__key(channel_name), dict())
+            channel.setdefault("settings", dict()).update(settings)
+            channel["settingsAppliedAt"] = time.time()
+            self.__save()
+
+    def touch_settings(self, channel_name):
+        """
+        Marks the recorded settings of a channel as verified now.
+        :param channel_name: the channel name, or None for the main channel
+        """
+        with self.__lock:
+            channel = self.__channels.get(self.__key(channel_name))
+            if channel is not None and "settings" in channel:
+                channel["settingsAppliedAt"] = time.time()
+                self.__save()
+
+    def get_image(self, channel_name):
+        """
+        :param channel_name: the channel name, or None for the main channel
+        :return: a tuple of (digest of the last uploaded profile image, epoch timestamp of the upload), or None
+        """
+        with self.__lock:
+            channel = self.__channels.get(self.__key(channel_name))
+            if channel is None or "image" not in channel:
+                return None
+            return channel["image"], channel["imageAppliedAt"]
+
+    def record_image(self, channel_name, digest):
+        """
+        Records a profile image that was successfully uploaded.
+        :param channel_name: the channel name, or None for the main channel
+        :param digest: the digest of the image, as returned by ChannelStateStore.image_digest
+        """
+        with self.__lock:
+            channel = self.__channels.setdefault(self.__key(channel_name), dict())
+            channel["image"] = digest
+            channel["imageAppliedAt"] = time.time()
+            self.__save()
+
+    def forget(self, channel_name):
+        """
+        Forgets everything recorded for a channel, e.g. after it is deleted or found to differ from the record.
+        :param channel_name: the channel name, or None for the main channel
+        """
+        with self.__lock:
+            if self.__channels.pop(self.__key(channel_name), None) is not None:
+                self.__save()
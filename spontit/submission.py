@@ -0,0 +1,133 @@
+import pickle
+import queue
+import threading
+import zlib
+from collections import deque
+
+
+class PushSubmitter:
+    """
+    Queues pushes for a pool of worker threads while keeping the memory they hold below a budget. The budget counts
+    the bytes of the queued and in-flight pushes as they are stored, not the number of pushes, so a few pushes to
+    very large recipient lists count as much as many small ones.
+
+    Each queued push is stored as one pickled (and, above compress_threshold bytes, zlib compressed) bytes object
+    instead of its payload dict and recipient lists. When the budget is full, submit blocks, times out or rejects
+    like queue.Queue.put, raising queue.Full.
+    """
+
+    def __init__(self, resource, max_pending_bytes=64 * 1024 * 1024, workers=4, compress_threshold=4096):
+        """
+        :param resource: an instance of SpontitResource
+        :param max_pending_bytes: the most bytes of queued and in-flight pushes to hold at once
+        :param workers: the number of threads sending pushes
+        :param compress_threshold: pushes whose pickled size is above this many bytes are compressed
+        """
+        assert type(max_pending_bytes) is int and max_pending_bytes > 0
+        assert type(workers) is int and workers > 0
+        self.resource = resource
+        self.max_pending_bytes = max_pending_bytes
+        self.compress_threshold = compress_threshold
+        self.rejected = 0
+        self.peak_pending_bytes = 0
+        self.__pending_bytes = 0
+        self.__pending_count = 0
+        self.__queue = deque()
+        self.__condition = threading.Condition()
+        self.__running = True
+        self.__workers = []
+        for index in range(workers):
+            worker = threading.Thread(target=self.__work, name=f"spontit-push-submitter-{index}", daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    @property
+    def pending_bytes(self):
+        """
+        :return: the bytes held by queued and in-flight pushes
+        """
+        return self.__pending_bytes
+
+    @property
+    def pending_count(self):
+        """
+        :return: the number of queued and in-flight pushes
+        """
+        return self.__pending_count
+
+    def __encode(self, push_kwargs):
+        encoded = pickle.dumps(push_kwargs, pickle.HIGHEST_PROTOCOL)
+        if len(encoded) > self.compress_threshold:
+            return True, zlib.compress(encoded, 1)
+        return False, encoded
+
+    def submit(self, block=True, timeout=None, **push_kwargs):
+        """
+        Queues a push.
+        :param block: whether to wait for room in the budget. If False, a push that does not fit is rejected.
+        :param timeout: the most seconds to wait for room when block is True, or None to wait indefinitely
+        :param push_kwargs: the arguments to SpontitResource.push
+        :return: a concurrent.futures.Future that resolves to the response of the push
+        """
+        from concurrent.futures import Future
+
+        compressed, encoded = self.__encode(push_kwargs)
+        size = len(encoded)
+        if size > self.max_pending_bytes:
+            raise Exception(f"The push takes {size} bytes, more than the whole budget of {self.max_pending_bytes}.")
+
+        future = Future()
+        with self.__condition:
+            if not self.__running:
+                raise Exception("The submitter has been shut down.")
+            fits = self.__pending_bytes + size <= self.max_pending_bytes
+            if not fits and block:
+                fits = self.__condition.wait_for(
+                    lambda: self.__pending_bytes + size <= self.max_pending_bytes or not self.__running, timeout)
+                if not self.__running:
+                    raise Exception("The submitter has been shut down.")
+            if not fits:
+                self.rejected += 1
+                raise queue.Full(f"{self.__pending_bytes} bytes of pushes are pending; "
+                                 f"{size} more would exceed the budget of {self.max_pending_bytes}.")
+            self.__pending_bytes += size
+            self.__pending_count += 1
+            self.peak_pending_bytes = max(self.peak_pending_bytes, self.__pending_bytes)
+            self.__queue.append((compressed, encoded, future))
+            self.__condition.notify_all()
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Stops the workers once every queued push has been sent. No more pushes can be submitted.
+        :param wait: whether to block until the workers have finished
+        """
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify_all()
+        if wait:
+            for worker in self.__workers:
+                worker.join()
+
+    def __work(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__queue or not self.__running)
+                if not self.__queue:
+                    return
+                compressed, encoded, future = self.__queue.popleft()
+
+            size = len(encoded)
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        push_kwargs = pickle.loads(zlib.decompress(encoded) if compressed else encoded)
+                        del encoded
+                        future.set_result(self.resource.push(**push_kwargs))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                with self.__condition:
+                    self.__pending_bytes -= size
+                    self.__pending_count -= 1
+                    self.__condition.notify_all()
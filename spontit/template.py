@@ -0,0 +1,180 @@
+import re
+from string import Formatter
+
+
+class PushTemplate:
+    """
+    A push notification whose text fields contain placeholders (e.g. "Hi {first_name}!") that are filled in per
+    recipient. The template is parsed once when it is created, so rendering a recipient only joins pre-split literal
+    text with that recipient's values. Recipients whose rendered text is identical are grouped so that they can be
+    sent with a single call to push.
+    """
+
+    # The character limits documented on SpontitResource.push.
+    LIMITS = {
+        "content": 2500,
+        "push_content": 100,
+        "push_title": 100,
+        "ios_subtitle": 20
+    }
+
+    __control_characters = re.compile("[\x00-\x08\x0b-\x1f\x7f]")
+
+    def __init__(self, content=None, push_content=None, push_title=None, ios_subtitle=None, escape=None,
+                 ellipsis="..."):
+        """
+        Compiles a template. Placeholders use str.format syntax ("{name}", "{amount:.2f}", "{{" for a literal brace)
+        and are looked up by name in the values given for each recipient. Attribute and index lookups ("{user.name}",
+        "{tags[0]}") are not supported; pass the looked-up values under their own names instead.
+        :param content: the template for the content of the push. Limited to 2500 characters once rendered.
+        :param push_content: the template for the push content. Limited to 100 characters once rendered.
+        :param push_title: the template for the push title. Limited to 100 characters once rendered.
+        :param ios_subtitle: the template for the iOS subtitle. Limited to 20 characters once rendered.
+        :param escape: a function applied to every substituted value after formatting. Defaults to
+        PushTemplate.strip_control_characters. Pass str to substitute values unchanged.
+        :param ellipsis: appended to a rendered field that had to be truncated to fit its limit
+        """
+        try:
+            assert content is not None or push_content is not None
+        except AssertionError:
+            raise Exception("You must provide a template for either the content, the push content, or both.")
+        if type(ellipsis) is not str or len(ellipsis) >= min(self.LIMITS.values()):
+            raise Exception("The ellipsis must be a string shorter than the smallest field limit.")
+
+        self.escape = escape if escape is not None else PushTemplate.strip_control_characters
+        self.ellipsis = ellipsis
+        self.fields = []
+        self.placeholders = set()
+
+        for field_name, template in (("content", content),
+                                     ("push_content", push_content),
+                                     ("push_title", push_title),
+                                     ("ios_subtitle", ios_subtitle)):
+            if template is None:
+                continue
+            if type(template) is not str:
+                raise Exception(f"The {field_name} template must be a string.")
+            parts = PushTemplate.__compile(template)
+            self.placeholders.update(part[0] for part in parts if type(part) is tuple)
+            self.fields.append((field_name, parts, self.LIMITS[field_name]))
+
+    @staticmethod
+    def strip_control_characters(value):
+        """
+        The default escape function. Removes control characters other than newlines and tabs, which would otherwise
+        be rendered as garbage in the notification.
+        :param value: the formatted value
+        :return: the escaped value
+        """
+        return PushTemplate.__control_characters.sub("", value)
+
+    @staticmethod
+    def __compile(template):
+        """
+        Splits a template into literal strings and (name, conversion, format_spec) placeholders. Adjacent literals
+        are merged and a template without placeholders compiles to a single literal.
+        :param template: the template string
+        :return: the list of parts
+        """
+        parts = []
+        for literal, name, format_spec, conversion in Formatter().parse(template):
+            if literal:
+                if parts and type(parts[-1]) is str:
+                    parts[-1] += literal
+                else:
+                    parts.append(literal)
+            if name is not None:
+                if name == "" or name.isdigit():
+                    raise Exception("Template placeholders must be named, e.g. {first_name}.")
+                if "." in name or "[" in name:
+                    raise Exception(f"Template placeholders must be plain names, e.g. {{first_name}}; \"{name}\" "
+                                    "uses an attribute or index lookup.")
+                if "{" in format_spec:
+                    raise Exception("Template placeholders cannot contain nested placeholders, e.g. {amount:{width}}.")
+                parts.append((name, conversion, format_spec))
+        return parts
+
+    def __render_field(self, parts, limit, values):
+        pieces = []
+        for part in parts:
+            if type(part) is str:
+                pieces.append(part)
+                continue
+            name, conversion, format_spec = part
+            try:
+                value = values[name]
+            except KeyError:
+                raise Exception(f"No value provided for the template placeholder \"{name}\".")
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            pieces.append(self.escape(format(value, format_spec) if format_spec or type(value) is not str else value))
+        rendered = "".join(pieces)
+        if len(rendered) > limit:
+            rendered = rendered[:limit - len(self.ellipsis)] + self.ellipsis
+        return rendered
+
+    def render(self, values):
+        """
+        Renders the template for one recipient.
+        :param values: a dict mapping placeholder names to values
+        :return: a dict of keyword arguments for SpontitResource.push (e.g. {"content": ..., "push_title": ...})
+        """
+        return {field_name: self.__render_field(parts, limit, values) for field_name, parts, limit in self.fields}
+
+    def render_batch(self, recipients):
+        """
+        Renders the template for many recipients and groups the recipients whose rendered text is identical.
+        Only the placeholders used by the template are looked at, so recipients that differ only in unused values
+        are rendered once.
+        :param recipients: a dict mapping each follower's userId to their values, or an iterable of
+        (userId, values) pairs
+        :return: a list of (push keyword arguments, list of userIds) tuples, in order of first appearance
+        """
+        if isinstance(recipients, dict):
+            recipients = recipients.items()
+
+        placeholders = sorted(self.placeholders)
+        rendered_by_values = dict()
+        groups = dict()
+        for follower, values in recipients:
+            try:
+                # Types are part of the key because equal values of different types (1, 1.0, True) format differently.
+                values_key = tuple((type(values[name]), values[name]) for name in placeholders)
+                hash(values_key)
+            except (KeyError, TypeError):
+                # Missing or unhashable values; render directly (a missing value raises with a useful message).
+                values_key = None
+            rendered = rendered_by_values.get(values_key) if values_key is not None else None
+            if rendered is None:
+                rendered = self.render(values)
+                if values_key is not None:
+                    rendered_by_values[values_key] = rendered
+            group_key = tuple(rendered[field_name] for field_name, _, _ in self.fields)
+            group = groups.get(group_key)
+            if group is None:
+                groups[group_key] = group = (rendered, [])
+            group[1].append(follower)
+        return list(groups.values())
+
+    def push_batch(self, resource, recipients, **push_kwargs):
+        """
+        Renders the template for many recipients and sends one push per distinct rendering, addressed to every
+        recipient that rendered to it.
+        :param resource: an instance of SpontitResource
+        :param recipients: a dict mapping each follower's userId to their values, or an iterable of
+        (userId, values) pairs
+        :param push_kwargs: any other arguments to SpontitResource.push that are the same for every recipient
+        (e.g. channel_name, link). Must not include the templated fields or push_to_followers.
+        :return: a list of (list of userIds, response) tuples, one per push sent
+        """
+        templated = [field_name for field_name, _, _ in self.fields if field_name in push_kwargs]
+        if templated or "push_to_followers" in push_kwargs:
+            raise Exception("push_batch sets " + ", ".join(templated or ["push_to_followers"]) +
+                            " itself; pass them to the template or as recipients instead.")
+        results = []
+        for rendered, followers in self.render_batch(recipients):
+            response = resource.push(push_to_followers=followers, **rendered, **push_kwargs)
+            results.append((followers, response))
+        return results
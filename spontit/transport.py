@@ -0,0 +1,146 @@
+import time
+
+
+class RequestsTransport:
+    """
+    The default transport of SpontitResource. Sends each request with requests.
+
+    A transport is any object with a request function taking (method, url, data=None, files=None, headers=None,
+    stream=False) and returning a response with status_code, headers, content (bytes) and elapsed (a timedelta from
+    sending the request until the response headers arrived). With stream=True the body may be read lazily when
+    content is first accessed.
+    """
+
+    def request(self, method, url, data=None, files=None, headers=None, stream=False):
+        # Imported here rather than at module level so that importing spontit (e.g. to build payloads or use
+        # Expiration) does not pay for loading requests, urllib3 and ssl until the first network call.
+        import requests
+
+        return requests.request(method, url=url, data=data, files=files, headers=headers, stream=stream)
+
+
+class RawResponse:
+    """
+    A response from Urllib3Transport. The body is kept as bytes; status_code, headers, content and elapsed match the
+    attributes of a requests response that SpontitResource uses.
+    """
+
+    def __init__(self, response, elapsed):
+        self.__response = response
+        self.__content = None
+        self.status_code = response.status
+        self.headers = response.headers
+        self.elapsed = elapsed
+
+    @property
+    def content(self):
+        if self.__content is None:
+            self.__content = self.__response.data
+            self.__response.release_conn()
+        return self.__content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        import json
+
+        return json.loads(self.content)
+
+    def __repr__(self):
+        return f"<RawResponse [{self.status_code}]>"
+
+
+class Urllib3Transport:
+    """
+    Sends requests through a urllib3 connection pool directly, skipping the session, hook, header merging and
+    Response object work that requests does on every call. Headers (normally the static dict from
+    SpontitResource._get_headers) are sent as given without being copied or merged, and response bodies stay bytes.
+    Like requests, it does not retry failed requests, and it follows up to max_redirects redirects, changing the
+    method to GET and dropping the body for the same redirect statuses as requests.
+    """
+
+    # The most redirects followed for one request, as in requests.
+    max_redirects = 30
+
+    def __init__(self, maxsize=10, timeout=None):
+        """
+        :param maxsize: the number of connections kept open per host. Set it to at least the number of threads
+        sending through the transport.
+        :param timeout: seconds to wait for the connection and for each read, or None to wait indefinitely
+        """
+        # Imported here so that importing spontit does not load threading.
+        import threading
+
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.__lock = threading.Lock()
+        self.__pool = None
+        self.__retries = None
+
+    def __pool_manager(self):
+        if self.__pool is None:
+            with self.__lock:
+                if self.__pool is None:
+                    # Imported on first use, like requests in RequestsTransport.
+                    import urllib3
+
+                    self.__retries = urllib3.Retry(0, read=False)
+                    self.__pool = urllib3.PoolManager(maxsize=self.maxsize, block=False,
+                                                      timeout=urllib3.Timeout(connect=self.timeout,
+                                                                              read=self.timeout))
+        return self.__pool
+
+    @staticmethod
+    def __redirected(status, method, body, headers):
+        """
+        Changes a request for a redirect the way requests does.
+        :return: the method, body and headers of the redirected request
+        """
+        if (status in (302, 303) and method != "HEAD") or (status == 301 and method == "POST"):
+            method = "GET"
+        if status not in (307, 308):
+            body = None
+            headers = {name: value for name, value in (headers or dict()).items()
+                       if name.lower() not in ("content-type", "content-length", "transfer-encoding")}
+        return method, body, headers
+
+    def request(self, method, url, data=None, files=None, headers=None, stream=False):
+        pool = self.__pool_manager()
+        if files is None:
+            body = data.encode("utf-8") if type(data) is str else data
+        else:
+            import urllib3
+
+            fields = dict(data) if data else dict()
+            for name, (file_name, content, content_type) in files.items():
+                fields[name] = (file_name, content if type(content) is bytes else content.read(), content_type)
+            # Encoded once, so that a 307 or 308 redirect can send the same body again.
+            body, content_type = urllib3.encode_multipart_formdata(fields)
+            headers = dict(headers or dict(), **{"Content-Type": content_type})
+
+        for _ in range(self.max_redirects + 1):
+            started = time.perf_counter()
+            response = pool.urlopen(method, url, body=body, headers=headers, retries=self.__retries, redirect=False,
+                                    preload_content=False)
+            location = response.get_redirect_location()
+            if not location:
+                break
+            from urllib.parse import urljoin
+
+            response.drain_conn()
+            response.release_conn()
+            url = urljoin(url, location)
+            method, body, headers = self.__redirected(response.status, method, body, headers)
+        else:
+            raise Exception(f"Exceeded {self.max_redirects} redirects.")
+
+        elapsed = time.perf_counter() - started
+        from datetime import timedelta
+
+        raw = RawResponse(response, timedelta(seconds=elapsed))
+        if not stream:
+            # Read the body now and return the connection to the pool, as requests does without stream.
+            len(raw.content)
+        return raw